@@ -1,8 +1,13 @@
 from mcp.server.fastmcp import FastMCP
 import mysql.connector
+import mysql.connector.pooling
 from mysql.connector import Error
 import time
 import hashlib
+import collections
+import contextlib
+import re
+import datetime
 
 DB_CONFIG = {
     "host": "localhost",
@@ -10,47 +15,166 @@ DB_CONFIG = {
     "password": "",
     "database": "ofxx_db"
 }
+POOL_SIZE = 8
 
 mcp = FastMCP("wordpress-users")
 
-# Cache storage
-_cache = {}
+# Cache storage (LRU order: oldest first)
+CacheEntry = collections.namedtuple("CacheEntry", "data timestamp tables")
+_cache = collections.OrderedDict()
 CACHE_TTL = 300  # 5 minutes
+CACHE_MAX = 1024  # max cached queries
+# TTL shrinks linearly from CACHE_LOW entries; at CACHE_HIGH the LRU tail is trimmed to CACHE_LOW
+CACHE_LOW, CACHE_HIGH = CACHE_MAX * 3 // 4, CACHE_MAX
+
+BATCH_CHUNK = 500  # parameter rows sent per executemany in run_batch
+
+# Connection pool, created on first use
+_POOL = None
+
+# Validated search_sql column tuples keyed on the raw columns argument
+_COL_CACHE = {}
+COL_CACHE_MAX = 256
+
+_IDENT_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+# FROM/JOIN clause up to the next keyword, e.g. "wp_posts p, wp_users u"
+_TABLE_REF_RE = re.compile(
+    r'\b(?:FROM|(?:STRAIGHT_)?JOIN)\s+([^;()]+?)'
+    r'(?=\s+(?:WHERE|GROUP|ORDER|LIMIT|HAVING|UNION|ON|USING|SET|VALUES'
+    r'|NATURAL|INNER|LEFT|RIGHT|CROSS|STRAIGHT_JOIN|JOIN)\b|\s*[;()]|\s*$)',
+    re.IGNORECASE
+)
+# Single target table of a write query; multi-table forms fall through to None
+_WRITE_TARGET_RE = re.compile(
+    r'\s*(?:INSERT\s+(?:(?:LOW_PRIORITY|DELAYED|HIGH_PRIORITY|IGNORE)\s+)*(?:INTO\s+)?'
+    r'|REPLACE\s+(?:(?:LOW_PRIORITY|DELAYED)\s+)*(?:INTO\s+)?'
+    r'|UPDATE\s+(?:(?:LOW_PRIORITY|IGNORE)\s+)*'
+    r'|DELETE\s+(?:(?:LOW_PRIORITY|QUICK|IGNORE)\s+)*FROM\s+'
+    r'|TRUNCATE\s+(?:TABLE\s+)?'
+    r'|ALTER\s+(?:IGNORE\s+)?TABLE\s+'
+    r'|DROP\s+(?:TEMPORARY\s+)?TABLE\s+(?:IF\s+EXISTS\s+)?'
+    r'|CREATE\s+(?:TEMPORARY\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?)'
+    r'((?:`?\w+`?\.)?`?\w+(?!\w)`?)(?!`?(?:\s+(?:AS\s+)?\w+)?\s*[,.])',
+    re.IGNORECASE
+)
+# Table list of an UPDATE, e.g. "wp_users u, wp_usermeta m"
+_UPDATE_REFS_RE = re.compile(r'\s*UPDATE\s+(.*?)\s+SET\b', re.IGNORECASE | re.DOTALL)
 
 
 def get_db():
-    """Get database connection"""
-    return mysql.connector.connect(**DB_CONFIG)
+    """Get pooled database connection (close() returns it to the pool)"""
+    global _POOL
+    if _POOL is None:
+        _POOL = mysql.connector.pooling.MySQLConnectionPool(
+            pool_name="wp",
+            pool_size=POOL_SIZE,
+            **DB_CONFIG
+        )
+    return _POOL.get_connection()
+
+
+@contextlib.contextmanager
+def db_cursor(**kwargs):
+    """Yield (cursor, connection) from the pool, always closing both"""
+    db = get_db()
+    try:
+        cursor = db.cursor(**kwargs)
+        try:
+            yield cursor, db
+        finally:
+            cursor.close()
+    finally:
+        db.close()
+
+
+# Column types stringified before returning: pydantic would fail on non-UTF-8
+# bytes and would change the datetime/TIME text format
+_STR_TYPES = (bytes, bytearray, datetime.datetime, datetime.timedelta)
+
+
+def _to_result_value(value):
+    """Stringify binary, datetime and TIME values, keep other column types native"""
+    return str(value) if isinstance(value, _STR_TYPES) else value
+
+
+def _rows_to_dicts(cursor):
+    """Fetch remaining rows as dicts, keeping int/float/NULL values native"""
+    cols = [d[0] for d in cursor.description or ()]
+    return [
+        dict(zip(cols, map(_to_result_value, row)))
+        for row in cursor.fetchall()
+    ]
+
+
+def parse_columns(columns):
+    """Split a comma-separated column list into a tuple of identifiers, or None if any is invalid"""
+    cleaned = _COL_CACHE.get(columns)
+    if cleaned is None:
+        cleaned = tuple(col.strip() for col in columns.split(","))
+        if not all(_IDENT_RE.fullmatch(col) for col in cleaned):
+            return None
+        if len(_COL_CACHE) >= COL_CACHE_MAX:
+            _COL_CACHE.clear()
+        _COL_CACHE[columns] = cleaned
+    return cleaned
 
 
 def get_cache_key(query):
-    """Generate cache key from query"""
-    return hashlib.md5(query.encode()).hexdigest()
+    """Generate cache key (raw 8-byte blake2b digest) from query"""
+    return hashlib.blake2b(query.encode("utf-8"), digest_size=8).digest()
 
 
-def is_cache_valid(cache_entry, ttl=CACHE_TTL):
-    """Check if cache entry is still valid"""
+def get_cache_pressure(size):
+    """Get memory pressure (0..1) as cache size goes from CACHE_LOW to CACHE_HIGH"""
+    return min(1.0, max(0.0, (size - CACHE_LOW) / (CACHE_HIGH - CACHE_LOW)))
+
+
+def get_effective_ttl(size, ttl=CACHE_TTL):
+    """Scale TTL down with cache pressure"""
+    return ttl * (1 - get_cache_pressure(size))
+
+
+def is_cache_valid(cache_entry, ttl=CACHE_TTL, size=0):
+    """Check if cache entry is still valid for the current cache size"""
     if not cache_entry:
         return False
-    return (time.time() - cache_entry["timestamp"]) < ttl
+    return (time.monotonic() - cache_entry.timestamp) < get_effective_ttl(size, ttl)
+
 
+def purge_expired_cache(ttl, now=None):
+    """Remove cache entries older than ttl seconds and return how many were removed"""
+    if now is None:
+        now = time.monotonic()
+    expired = [key for key, entry in _cache.items() if (now - entry.timestamp) >= ttl]
+    for key in expired:
+        del _cache[key]
+    return len(expired)
 
-def get_cached_query(query):
-    """Get cached query result if valid"""
-    key = get_cache_key(query)
+
+def _cache_get(key):
+    """Get cached query result for a precomputed key if valid"""
     entry = _cache.get(key)
-    if is_cache_valid(entry):
-        return entry["data"]
-    return None
+    if entry is None:
+        return None
+    if not is_cache_valid(entry, size=len(_cache)):
+        del _cache[key]
+        return None
+    _cache.move_to_end(key)
+    return entry.data
 
 
-def set_cached_query(query, data):
-    """Store query result in cache"""
-    key = get_cache_key(query)
-    _cache[key] = {
-        "data": data,
-        "timestamp": time.time()
-    }
+def _cache_set(key, data, tables):
+    """
+    Store query result under a precomputed key, tagged with the tables it reads,
+    trimming least recently used entries down to CACHE_LOW once the cache reaches
+    CACHE_HIGH. data is stored by reference; callers must not mutate it.
+    """
+    _cache[key] = CacheEntry(data, time.monotonic(), tables)
+    _cache.move_to_end(key)
+    if len(_cache) >= CACHE_HIGH:
+        while len(_cache) > CACHE_LOW:
+            _cache.popitem(last=False)
 
 
 @mcp.tool()
@@ -121,6 +245,13 @@ def search_sql(
                 "suggested_tables": ["wp_users", "wp_posts", "wp_comments", "wp_options", "wp_usermeta"]
             }
         
+        if not _IDENT_RE.fullmatch(table):
+            return {
+                "error": f"Invalid table name '{table}'.",
+                "needs_clarification": True,
+                "message": "Table names may only contain letters, digits and underscores. Please verify the table name."
+            }
+        
         # Determine which columns to search
         if not columns:
             # Try to infer common columns based on table
@@ -140,44 +271,26 @@ def search_sql(
                 }
         
         # Build the WHERE clause for multiple columns
-        column_list = [col.strip() for col in columns.split(",")]
+        column_list = parse_columns(columns)
         if not column_list:
             return {
                 "error": "No valid columns specified.",
                 "needs_clarification": True,
-                "message": "Please specify which columns to search."
+                "message": "Please specify which columns to search. Column names may only contain letters, digits and underscores."
             }
         
         # Build SQL query with LIKE conditions
         like_operator = "LIKE BINARY" if case_sensitive else "LIKE"
-        where_conditions = []
-        params = []
-        
-        for col in column_list:
-            where_conditions.append(f"{col} {like_operator} %s")
-            params.append(search_pattern)
-        
-        where_clause = " OR ".join(where_conditions)
+        where_clause = f" {like_operator} %s OR ".join(column_list) + f" {like_operator} %s"
         
         # Construct the query
         query = f"SELECT * FROM {table} WHERE {where_clause} LIMIT %s"
-        params.append(limit)
+        params = [search_pattern] * len(column_list) + [limit]
         
         # Execute query
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        cursor.close()
-        db.close()
-        
-        # Convert results to list of dicts
-        data = []
-        for row in results:
-            clean_row = {}
-            for key, value in row.items():
-                clean_row[key] = str(value) if value is not None else None
-            data.append(clean_row)
+        with db_cursor() as (cursor, db):
+            cursor.execute(query, params)
+            data = _rows_to_dicts(cursor)
         
         # Check if we hit the limit
         result_count = len(data)
@@ -189,7 +302,7 @@ def search_sql(
             "data": data,
             "count": result_count,
             "table": table,
-            "columns_searched": column_list,
+            "columns_searched": list(column_list),
             "search_pattern": search_pattern,
             "warning": warning,
             "message": f"Found {result_count} result(s) in {table} matching '{search_term}'"
@@ -213,11 +326,64 @@ def search_sql(
         return {"error": f"Database error: {e}"}
 
 
+_LEADING_WS_RE = re.compile(r'\s*')
+_WRITE_KEYWORDS = ('INSERT', 'UPDATE', 'DELETE', 'ALTER', 'DROP', 'CREATE', 'TRUNCATE', 'REPLACE')
+_WRITE_RE = re.compile(r'(?:%s)\b' % '|'.join(_WRITE_KEYWORDS), re.IGNORECASE)
+WRITE_SCAN_CHARS = 32  # chars after leading whitespace inspected for the keyword
+
+
 def is_write_query(query: str):
     """Check if query is a write operation (INSERT, UPDATE, DELETE, etc.)"""
-    query_upper = query.strip().upper()
-    write_keywords = ['INSERT', 'UPDATE', 'DELETE', 'ALTER', 'DROP', 'CREATE', 'TRUNCATE', 'REPLACE']
-    return any(query_upper.startswith(keyword) for keyword in write_keywords)
+    start = _LEADING_WS_RE.match(query).end()
+    return _WRITE_RE.match(query, start, start + WRITE_SCAN_CHARS) is not None
+
+
+def _table_name(ref):
+    """Strip backticks and any database qualifier from a table reference"""
+    return ref.replace("`", "").rsplit(".", 1)[-1].lower()
+
+
+def get_query_tables(query: str):
+    """Get the set of tables referenced by FROM/JOIN clauses of a query, or None if a reference cannot be parsed"""
+    tables = set()
+    for clause in _TABLE_REF_RE.findall(query):
+        for ref in clause.split(","):
+            ref = ref.split(None, 1)
+            if not ref:
+                continue
+            name = _table_name(ref[0])
+            if not _IDENT_RE.fullmatch(name):
+                return None
+            tables.add(name)
+    return frozenset(tables)
+
+
+def get_write_tables(query: str):
+    """Get the set of tables a write query touches, or None if the target cannot be determined"""
+    match = _WRITE_TARGET_RE.match(query)
+    if not match:
+        return None
+    update_refs = _UPDATE_REFS_RE.match(query)
+    if update_refs and "," in update_refs.group(1):
+        return None
+    tables = get_query_tables(query)
+    if tables is None:
+        return None
+    return tables | {_table_name(match.group(1))}
+
+
+def invalidate_cache(query: str):
+    """
+    Evict cached reads of the tables a write query touches. Everything is evicted
+    if the write target is unknown; reads with no parsed tables are always evicted.
+    """
+    tables = get_write_tables(query)
+    if tables is None:
+        _cache.clear()
+        return
+    stale = [key for key, entry in _cache.items() if not entry.tables or entry.tables & tables]
+    for key in stale:
+        del _cache[key]
 
 
 @mcp.tool()
@@ -251,10 +417,11 @@ def run_query(query: str, use_cache: bool = True, force_refresh: bool = False, c
         if is_write:
             use_cache = False
         
-        # Check cache first (only for read queries)
-        if use_cache and not force_refresh and not is_write:
-            cached = get_cached_query(query)
-            if cached:
+        # Check cache first (only for read queries); the key is shared with the store below
+        if use_cache:
+            cache_key = get_cache_key(query)
+            cached = None if force_refresh else _cache_get(cache_key)
+            if cached is not None:
                 return {
                     "data": cached,
                     "cached": True,
@@ -263,19 +430,19 @@ def run_query(query: str, use_cache: bool = True, force_refresh: bool = False, c
                 }
         
         # Execute query
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
-        cursor.execute(query)
+        with db_cursor() as (cursor, db):
+            cursor.execute(query)
+            
+            # For write operations, commit and get affected rows
+            if is_write:
+                affected_rows = cursor.rowcount
+                db.commit()
+            else:
+                data = _rows_to_dicts(cursor)
         
-        # For write operations, commit and get affected rows
         if is_write:
-            affected_rows = cursor.rowcount
-            db.commit()
-            cursor.close()
-            db.close()
-            
-            # Clear cache after write operation
-            _cache.clear()
+            # Evict cached reads of the written table
+            invalidate_cache(query)
             
             return {
                 "success": True,
@@ -284,22 +451,10 @@ def run_query(query: str, use_cache: bool = True, force_refresh: bool = False, c
                 "message": f"Write operation completed successfully. {affected_rows} row(s) affected."
             }
         
-        # For read operations, fetch results
-        results = cursor.fetchall()
-        cursor.close()
-        db.close()
-        
-        # Convert to list of dicts (handle datetime serialization)
-        data = []
-        for row in results:
-            clean_row = {}
-            for key, value in row.items():
-                clean_row[key] = str(value) if value is not None else None
-            data.append(clean_row)
-        
         # Store in cache (only for read queries)
         if use_cache:
-            set_cached_query(query, data)
+            # Unparsed reads get no tags, so every write evicts them
+            _cache_set(cache_key, data, get_query_tables(query) or frozenset())
         
         return {
             "data": data,
@@ -313,6 +468,76 @@ def run_query(query: str, use_cache: bool = True, force_refresh: bool = False, c
         return {"error": f"Database error: {e}"}
 
 
+@mcp.tool()
+def run_batch(query: str, param_rows: list[list], confirm_write: bool = False):
+    """
+    Run a parameterised write query for many rows of parameters in one transaction.
+    
+    Rows are sent BATCH_CHUNK at a time with executemany; for INSERT ... VALUES the
+    driver rewrites each chunk into a single multi-row INSERT.
+    
+    Args:
+        query: SQL write query with %s placeholders
+        param_rows: List of parameter lists, one per row
+        confirm_write: Must be True to execute the batch
+    
+    Example:
+        run_batch(
+            "INSERT INTO wp_usermeta (user_id, meta_key, meta_value) VALUES (%s, %s, %s)",
+            [[1, "nickname", "john"], [2, "nickname", "jane"]],
+            confirm_write=True
+        )
+    """
+    try:
+        if not is_write_query(query):
+            return {
+                "error": "run_batch only accepts write operations.",
+                "query_type": "READ",
+                "message": "Use run_query for read queries."
+            }
+        
+        if not param_rows:
+            return {
+                "error": "param_rows cannot be empty.",
+                "needs_clarification": True,
+                "message": "Please provide at least one row of parameters."
+            }
+        
+        # Safety check for write operations
+        if not confirm_write:
+            return {
+                "error": "Write operation detected. This batch will modify data.",
+                "query_type": "WRITE",
+                "row_count": len(param_rows),
+                "message": "To execute this batch, set confirm_write=True. Example: run_batch(query, param_rows, confirm_write=True)",
+                "query_preview": query[:100] + "..." if len(query) > 100 else query
+            }
+        
+        affected_rows = 0
+        with db_cursor() as (cursor, db):
+            try:
+                for start in range(0, len(param_rows), BATCH_CHUNK):
+                    cursor.executemany(query, param_rows[start:start + BATCH_CHUNK])
+                    affected_rows += cursor.rowcount
+                db.commit()
+            except Error:
+                db.rollback()
+                raise
+        
+        # Evict cached reads of the written table once for the whole batch
+        invalidate_cache(query)
+        
+        return {
+            "success": True,
+            "query_type": "WRITE",
+            "affected_rows": affected_rows,
+            "message": f"Batch completed successfully. {len(param_rows)} parameter row(s), {affected_rows} row(s) affected."
+        }
+        
+    except Error as e:
+        return {"error": f"Database error: {e}"}
+
+
 @mcp.tool()
 def clear_cache():
     """Clear all cached query results"""
@@ -322,22 +547,24 @@ def clear_cache():
 
 @mcp.tool()
 def get_cache_info():
-    """Get information about cached queries"""
-    info = {
+    """Get information about cached queries (expired entries are evicted first)"""
+    ttl = get_effective_ttl(len(_cache))
+    now = time.monotonic()
+    evicted = purge_expired_cache(ttl, now)
+    return {
         "total_cached_queries": len(_cache),
-        "cache_entries": []
+        "evicted_expired": evicted,
+        "effective_ttl_seconds": ttl,
+        "cache_entries": [
+            {
+                "key": key.hex()[:16] + "...",
+                "age_seconds": now - entry.timestamp,
+                "is_valid": True,  # expired entries were just purged; kept for response compatibility
+                "row_count": len(entry.data) if entry.data else 0
+            }
+            for key, entry in _cache.items()
+        ]
     }
-    
-    for key, entry in _cache.items():
-        age = time.time() - entry["timestamp"]
-        info["cache_entries"].append({
-            "key": key[:16] + "...",
-            "age_seconds": round(age, 2),
-            "is_valid": is_cache_valid(entry),
-            "row_count": len(entry["data"]) if entry["data"] else 0
-        })
-    
-    return info
 
 
 if __name__ == "__main__":